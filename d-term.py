@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
 
 import dbus
+from dbus.mainloop.glib import DBusGMainLoop
+from gi.repository import GLib, Gio
 import sys
 import xml.etree.ElementTree as ET
+import os
+import shutil
+import urllib.parse
 import time
 import argparse
 import fnmatch
+import re
+from collections import defaultdict, deque
+try:
+    import re2
+except ImportError:
+    re2 = None
 
 parser = argparse.ArgumentParser(prog="dbus-txt", description="A command line utility to list dbus services in either the system or the session bus, and filter by object, interface or service name.")
 group = parser.add_mutually_exclusive_group()
@@ -17,28 +28,241 @@ parser.add_argument('-s', '--service', help="Show only services whose name match
 parser.add_argument('-p', '--process', help="Show only services whose cmd line matches this (can use * and ? as wildcards)")
 parser.add_argument('-a', '--all', action='store_true', help="Show also private names (:X.Y)")
 parser.add_argument('-w', '--wakeup', action='store_true', help="Show info for activatable services")
+parser.add_argument('-c', '--cache', action='store_true', help="Reuse the introspection data saved by previous runs for the services whose process is still the same")
 parser.add_argument('-v', '--verbose', action='store_true', help="Show all the service info when doing an object, interface or process filtering")
 args = parser.parse_args()
 
+DBusGMainLoop(set_as_default=True)
+
 if args.system:
     current_bus = dbus.SystemBus()
+    bus_name = 'system'
 elif args.session:
     current_bus = dbus.SessionBus()
+    bus_name = 'session'
 else:
     parser.print_help()
     sys.exit(1)
 
-search_object = args.object
-search_interface = args.interface
-search_service = args.service
-search_process = args.process
+class name_filter:
+    """ A wildcard pattern, translated and compiled only once """
+    def __init__(self, pattern):
+        self._pattern = pattern
+        self._literal = not any(c in pattern for c in '*?[')
+        self._regex = None if self._literal else name_filter.compile(pattern)
+        # every dot-separated component without wildcards must be a component of any matching
+        # name; a '[' can hide a dot inside a set, so those patterns don't get a prefilter
+        if '[' in pattern:
+            self._bloom = 0
+        else:
+            self._bloom = name_filter.get_bloom([c for c in pattern.split('.') if '*' not in c and '?' not in c])
+        # the '/'-separated components before the first one with wildcards, which any matching path must share
+        self._literal_prefix = []
+        for component in pattern.split('/')[:-1]:
+            if any(c in component for c in '*?['):
+                break
+            self._literal_prefix.append(component)
+
+    @staticmethod
+    def create(pattern):
+        if pattern is None:
+            return None
+        return name_filter(pattern)
+
+    @staticmethod
+    def compile(pattern):
+        """ Uses RE2, which matches in linear time, if it is installed """
+        if re2 is not None:
+            try:
+                return re2.compile(name_filter.translate_for_re2(pattern))
+            except re2.error:
+                pass
+        return re.compile(fnmatch.translate(pattern))
+
+    @staticmethod
+    def translate_for_re2(pattern):
+        # fnmatch.translate() emits atomic groups and lookaheads, which RE2 doesn't support
+        result = '(?s:'
+        i = 0
+        n = len(pattern)
+        while i < n:
+            c = pattern[i]
+            i += 1
+            if c == '*':
+                if not result.endswith('.*'):
+                    result += '.*'
+            elif c == '?':
+                result += '.'
+            elif c == '[':
+                j = i
+                if j < n and pattern[j] == '!':
+                    j += 1
+                if j < n and pattern[j] == ']':
+                    j += 1
+                while j < n and pattern[j] != ']':
+                    j += 1
+                if j >= n:
+                    result += '\\['
+                    continue
+                # split the set in chunks at the range hyphens and remove the empty ranges, like fnmatch does
+                chunks = []
+                k = i + 2 if pattern[i] == '!' else i + 1
+                while True:
+                    k = pattern.find('-', k, j)
+                    if k < 0:
+                        break
+                    chunks.append(pattern[i:k])
+                    i = k + 1
+                    k = k + 3
+                chunk = pattern[i:j]
+                if chunk:
+                    chunks.append(chunk)
+                else:
+                    chunks[-1] += '-'
+                for k in range(len(chunks) - 1, 0, -1):
+                    if chunks[k - 1][-1] > chunks[k][0]:
+                        chunks[k - 1] = chunks[k - 1][:-1] + chunks[k][1:]
+                        del chunks[k]
+                # RE2 would take '[' followed by ':' as the start of a POSIX class
+                chars = '-'.join(c.replace('\\', '\\\\').replace('-', '\\-').replace('[', '\\[') for c in chunks)
+                i = j + 1
+                if not chars:
+                    # an empty set never matches
+                    result += '[^\\x00-\\x{10FFFF}]'
+                elif chars == '!':
+                    result += '.'
+                else:
+                    if chars[0] == '!':
+                        chars = '^' + chars[1:]
+                    elif chars[0] == '^':
+                        chars = '\\' + chars
+                    result += '[' + chars + ']'
+            else:
+                result += re.escape(c)
+        return result + ')'
+
+    @staticmethod
+    def get_bloom(components):
+        bloom = 0
+        for component in components:
+            bloom |= 1 << (hash(component) & 63)
+        return bloom
+
+    def may_match_any(self, bloom):
+        """ Returns False if no name summarized in the bloom bitmap can match this filter """
+        return (bloom & self._bloom) == self._bloom
+
+    def get_pattern(self):
+        return self._pattern
+
+    def is_literal(self):
+        return self._literal
+
+    def get_literal_prefix(self):
+        return self._literal_prefix
+
+    def match(self, name):
+        if name is None:
+            return False
+        if self._literal:
+            return name == self._pattern
+        return self._regex.fullmatch(name) is not None
+
+search_object = name_filter.create(args.object)
+search_interface = name_filter.create(args.interface)
+search_service = name_filter.create(args.service)
+search_process = name_filter.create(args.process)
 verbose = args.verbose
 all = args.all
 wakeup = args.wakeup
+cache_dir = os.path.join(GLib.get_user_cache_dir(), 'd-term', bus_name) if args.cache else None
+
+class dbus_batch:
+    """ Sends several DBus calls at once and waits until all of them have been answered """
+    # the system bus allows only 128 pending replies per connection by default
+    max_pending = 64
+
+    def __init__(self, bus):
+        self._bus = bus
+        self._pending = 0
+        self._queue = deque()
+        self._loop = GLib.MainLoop()
+
+    def call(self, service_name, object_path, interface, method, signature, args, reply_handler, error_handler):
+        self._queue.append((service_name, object_path, interface, method, signature, args, reply_handler, error_handler))
+        self._send_queued()
+
+    def _send_queued(self):
+        while self._pending < dbus_batch.max_pending and len(self._queue) != 0:
+            self._send(*self._queue.popleft())
+
+    def _send(self, service_name, object_path, interface, method, signature, args, reply_handler, error_handler):
+        def on_reply(*reply):
+            try:
+                reply_handler(*reply)
+            finally:
+                self._call_done()
+
+        def on_error(error):
+            try:
+                error_handler(error)
+            finally:
+                self._call_done()
+
+        try:
+            self._bus.call_async(service_name, object_path, interface, method, signature, args, on_reply, on_error)
+        except Exception as error:
+            error_handler(error)
+            return
+        self._pending += 1
+
+    def _call_done(self):
+        self._pending -= 1
+        self._send_queued()
+        if self._pending == 0:
+            self._loop.quit()
+
+    def wait(self):
+        if self._pending != 0:
+            self._loop.run()
+
+class object_path_tree:
+    """ Stores object paths by their '/'-separated components """
+    def __init__(self):
+        self._children = {}
+        self._path = None
+
+    def add(self, path):
+        node = self
+        for component in path.split('/'):
+            child = node._children.get(component)
+            if child is None:
+                child = object_path_tree()
+                node._children[component] = child
+            node = child
+        node._path = path
+
+    def find(self, components):
+        node = self
+        for component in components:
+            node = node._children.get(component)
+            if node is None:
+                return None
+        return node
+
+    def get_paths(self):
+        pending = [self]
+        while len(pending) != 0:
+            node = pending.pop()
+            if node._path is not None:
+                yield node._path
+            pending.extend(node._children.values())
 
 class dbus_service:
     counter = 0
+    skip = 0
     last_time = 0
+    nul_to_space = bytes.maketrans(b'\0', b' ')
 
     def __init__(self, bus, name, activated = True):
         self._bus = bus
@@ -46,26 +270,136 @@ class dbus_service:
         self._executable = None
         self._activated = activated
         self._pid = None
+        self._start_time = None
+        self._owner = None
         self._objects = {}
-        if activated:
-            self._objects = self._get_objects(bus, name)
-            # try to get the executable
-            self._find_executable()
+        self._object_tree = object_path_tree()
+        self._interface_bloom = 0
+
+    @staticmethod
+    def introspect_services(bus, services, cache_dir):
+        # introspect the trees of all the services together, level by level, sending all the calls of each level at once
+        roots = [(service, dbus_object(bus, service._name, '', None, service._get_cache_dir(cache_dir)))
+                 for service in services if service._activated]
+        level = [root for service, root in roots]
+        while len(level) != 0:
+            batch = dbus_batch(bus)
+            for element in level:
+                element.introspect(batch)
+            batch.wait()
+            level = [child for element in level for child in element.get_direct_children()]
+        for service, root in roots:
+            dbus_service.show_progress()
+            service._set_objects(root.get_children_objects())
+
+    def _set_objects(self, objects):
+        self._objects = objects
+        for object_path in self._objects:
+            self._object_tree.add(object_path)
+        for object in self._objects.values():
+            for interface_name in object.get_interfaces():
+                self._interface_bloom |= name_filter.get_bloom(interface_name.split('.'))
+
+    def _get_cache_dir(self, cache_dir):
+        # the cached data is valid only while the same process keeps the same connection
+        if cache_dir is None or self._owner is None or self._start_time is None:
+            return None
+        service_cache_dir = os.path.join(cache_dir, f"{self._pid}-{self._start_time}", self._owner)
+        try:
+            os.makedirs(service_cache_dir, exist_ok=True)
+        except OSError:
+            return None
+        return service_cache_dir
+
+    @staticmethod
+    def start_services(bus, services):
+        batch = dbus_batch(bus)
+        for service in services:
+            batch.call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'StartServiceByName',
+                       'su', (service._name, 0), lambda result: None, lambda error: None)
+        batch.wait()
+
+    @staticmethod
+    def find_executables(bus, services, use_cache):
+        # ask for all the PIDs (and, if the cache is used, the connection names) at once
+        batch = dbus_batch(bus)
+        for service in services:
+            if not service._activated:
+                continue
+            batch.call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'GetConnectionUnixProcessID',
+                       's', (service._name,), service._on_pid_reply, service._on_pid_error)
+            if use_cache:
+                batch.call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'GetNameOwner',
+                           's', (service._name,), service._on_owner_reply, service._on_owner_error)
+        batch.wait()
+        for service in services:
+            service._find_executable(use_cache)
+
+    def _on_pid_reply(self, pid):
+        self._pid = pid
+
+    def _on_pid_error(self, error):
+        self._pid = None
+
+    def _on_owner_reply(self, owner):
+        self._owner = str(owner)
 
-    def _find_executable(self):
-        proxy = self._bus.get_object('org.freedesktop.DBus', '/org/freedesktop/DBus')
+    def _on_owner_error(self, error):
+        self._owner = None
+
+    @staticmethod
+    def read_proc_file(proc_file):
+        try:
+            fd = os.open(proc_file, os.O_RDONLY)
+        except OSError:
+            return None
         try:
-            self._pid = proxy.GetConnectionUnixProcessID(self._name, dbus_interface='org.freedesktop.DBus')
-        except:
+            data = os.read(fd, 4096)
+            # very long command lines need more than one read
+            while len(data) % 4096 == 0:
+                chunk = os.read(fd, 4096)
+                if len(chunk) == 0:
+                    break
+                data += chunk
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+        return data
+
+    @staticmethod
+    def read_start_time(pid):
+        data = dbus_service.read_proc_file(f"/proc/{pid}/stat")
+        if data is None:
+            return None
+        # the start time is the 22nd field; the 2nd one is the command name, which can contain spaces
+        fields = data.rpartition(b')')[2].split()
+        if len(fields) < 20:
+            return None
+        return fields[19].decode('ascii')
+
+    def _find_executable(self, use_cache):
+        if self._pid is None:
             return
-        proc_file = f"/proc/{self._pid}/cmdline"
-        with open(proc_file, "r") as proc_data:
-            self._executable = proc_data.readline().replace("\0", " ").strip()
+        data = dbus_service.read_proc_file(f"/proc/{self._pid}/cmdline")
+        if data is None:
+            return
+        self._executable = data.translate(dbus_service.nul_to_space).strip().decode('utf-8', 'replace')
+        # the start time is needed only to validate the cached data
+        if use_cache:
+            self._start_time = dbus_service.read_start_time(self._pid)
 
-    def _get_objects(self, bus, name):
-        obj = dbus_object(bus, name, '', None)
-        object_list = obj.get_children_objects()
-        return object_list
+    @staticmethod
+    def clean_cache(cache_dir):
+        """ Removes the cached data of the processes that are no longer running """
+        try:
+            entries = os.listdir(cache_dir)
+        except OSError:
+            return
+        for entry in entries:
+            pid, _, start_time = entry.partition('-')
+            if dbus_service.read_start_time(pid) != start_time:
+                shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
 
     def get_name(self):
         return self._name
@@ -76,77 +410,105 @@ class dbus_service:
     def get_executable(self):
         return self._executable, self._pid
 
-    def has_object(self, object_path):
-        if object_path is None:
+    def has_object(self, object_filter):
+        if object_filter is None:
             return True
-        return len(fnmatch.filter(self._objects, object_path)) != 0
+        if object_filter.is_literal():
+            return object_filter.get_pattern() in self._objects
+        # only the paths below the literal part of the pattern can match it
+        node = self._object_tree.find(object_filter.get_literal_prefix())
+        if node is None:
+            return False
+        for object_path in node.get_paths():
+            if object_filter.match(object_path):
+                return True
+        return False
 
-    def has_interface(self, interface_name):
-        if interface_name is None:
+    def has_interface(self, interface_filter):
+        if interface_filter is None:
             return True
-        for object in self._objects:
-            if object.has_interface(interface_name):
+        if not interface_filter.may_match_any(self._interface_bloom):
+            return False
+        for object in self._objects.values():
+            if object.has_interface(interface_filter):
                 return True
         return False
 
     @staticmethod
     def show_progress():
-        if time.time()-dbus_service.last_time < .1:
+        # only check the clock once every 64 calls
+        dbus_service.skip = (dbus_service.skip + 1) & 0x3F
+        if dbus_service.skip != 0:
             return
-        dbus_service.last_time = time.time()
-        if dbus_service.counter == 0:
-            print('/', file=sys.stderr, end='\r')
-            dbus_service.counter = 1
-        elif dbus_service.counter == 1:
-            print('-', file=sys.stderr, end='\r')
-            dbus_service.counter = 2
-        elif dbus_service.counter == 2:
-            print('\\', file=sys.stderr, end='\r')
-            dbus_service.counter = 3
-        else:
-            print('|', file=sys.stderr, end='\r')
-            dbus_service.counter = 0
-
-
-    @staticmethod
-    def dbus_array_to_python(darray):
-        return [element for element in darray]
+        now = time.monotonic_ns()
+        if now - dbus_service.last_time < 100000000:
+            return
+        dbus_service.last_time = now
+        print('/-\\|'[dbus_service.counter], file=sys.stderr, end='\r')
+        dbus_service.counter = (dbus_service.counter + 1) & 3
 
     @staticmethod
-    def get_services(bus, find_all, wake_up):
+    def get_services(bus, find_all, wake_up, cache_dir, service_filter, process_filter):
         proxy = bus.get_object('org.freedesktop.DBus', '/org/freedesktop/DBus')
         output = []
-        names = dbus_service.dbus_array_to_python(proxy.ListNames(dbus_interface='org.freedesktop.DBus'))
-        activatable_names = dbus_service.dbus_array_to_python(proxy.ListActivatableNames(dbus_interface='org.freedesktop.DBus'))
+        names = list(proxy.ListNames(dbus_interface='org.freedesktop.DBus'))
+        activatable_names = list(proxy.ListActivatableNames(dbus_interface='org.freedesktop.DBus'))
+        running_names = set(names)
 
         for name in names:
-            dbus_service.show_progress()
             if name[0] == ':' and not find_all:
                 continue
+            if service_filter is not None and not service_filter.match(name):
+                continue
             output.append(dbus_service(bus, name))
 
+        woken_up = []
         for name in activatable_names:
-            if name in names:
+            if name in running_names:
+                continue
+            if service_filter is not None and not service_filter.match(name):
                 continue
             print(f"Waking up service {name}")
             output.append(dbus_service(bus, name, wake_up))
-
+            if wake_up:
+                woken_up.append(output[-1])
+        dbus_service.start_services(bus, woken_up)
+
+        dbus_service.find_executables(bus, output, cache_dir is not None)
+        if process_filter is not None:
+            output = [service for service in output if process_filter.match(service._executable)]
+        if cache_dir is not None:
+            dbus_service.clean_cache(cache_dir)
+        dbus_service.introspect_services(bus, output, cache_dir)
         return output
 
 class dbus_object:
-    def __init__(self, bus, service_name, object_name, parent_object):
+    def __init__(self, bus, service_name, object_name, parent_object, cache_dir = None, preloaded_node_info = None):
         self._bus = bus
         self._service_name = service_name
         self._object_name = object_name
         self._parent_object = parent_object
+        parent_path = parent_object._path if parent_object is not None else ''
+        if parent_path == '/':
+            parent_path = ''
+        self._path = parent_path + '/' + object_name
+        self._cache_dir = parent_object._cache_dir if parent_object is not None else cache_dir
         self._child_objects = []
         self._interfaces = []
-        self._get_introspection()
+        self._interfaces_set = frozenset()
+        self._preloaded_node_info = preloaded_node_info
 
-    def has_interface(self, interface_name):
-        if interface_name is None:
+    def has_interface(self, interface_filter):
+        if interface_filter is None:
             return True
-        return len(fnmatch.filter(self._interfaces, interface_name)) != 0
+        if self._interfaces is None:
+            return False
+        if interface_filter.is_literal():
+            return interface_filter.get_pattern() in self._interfaces_set
+        for interface_name in self._interfaces:
+            if interface_filter.match(interface_name):
+                return True
+        return False
 
     def get_interfaces(self):
         if self._interfaces is None:
@@ -154,24 +516,72 @@ class dbus_object:
         return self._interfaces
 
     def get_path(self):
-        parent = self._parent_object.get_path() if self._parent_object is not None else ''
-        if parent == '/':
-            parent = ''
-        return parent + '/' + self._object_name
+        return self._path
 
-    def _get_introspection(self):
-        try:
-            proxy = self._bus.get_object(self._service_name, self.get_path())
-        except:
-            self._interfaces = None
+    def get_direct_children(self):
+        return self._child_objects
+
+    def introspect(self, batch):
+        if self._preloaded_node_info is not None:
+            self._load_node_info(self._preloaded_node_info)
+            self._preloaded_node_info = None
+            return
+        if self._cache_dir is not None:
+            try:
+                with open(self._get_cache_file(), 'r') as cached_data:
+                    introspect_data = cached_data.read()
+            except OSError:
+                pass
+            else:
+                self._parse_introspection(introspect_data)
+                return
+        batch.call(self._service_name, self._path, 'org.freedesktop.DBus.Introspectable', 'Introspect', '', (),
+                   self._on_introspect_reply, self._on_introspect_error)
+
+    def _on_introspect_error(self, error):
+        self._interfaces = None
+        # only report services that have no owner; objects that can't be introspected are silently ignored
+        if self._parent_object is not None or not isinstance(error, dbus.exceptions.DBusException):
+            return
+        if error.get_dbus_name() in ('org.freedesktop.DBus.Error.ServiceUnknown', 'org.freedesktop.DBus.Error.NameHasNoOwner'):
             print(f"Failed to connect to service {self._service_name}")
+
+    def _get_cache_file(self):
+        return os.path.join(self._cache_dir, urllib.parse.quote(self._path, safe='') + '.xml')
+
+    def _on_introspect_reply(self, introspect_data):
+        introspect_data = str(introspect_data)
+        if self._cache_dir is not None:
+            # write to a temporary file first, so other instances never read a partial file
+            cache_file = self._get_cache_file()
+            temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+            try:
+                with open(temporary_file, 'w') as cached_data:
+                    cached_data.write(introspect_data)
+                os.replace(temporary_file, cache_file)
+            except OSError:
+                try:
+                    os.unlink(temporary_file)
+                except OSError:
+                    pass
+        self._parse_introspection(introspect_data)
+
+    def _parse_introspection(self, introspect_data):
+        try:
+            node_info = Gio.DBusNodeInfo.new_for_xml(introspect_data)
+        except GLib.Error:
+            self._parse_introspection_elements(introspect_data)
             return
+        self._load_node_info(node_info)
+
+    def _parse_introspection_elements(self, introspect_data):
+        # GIO rejects data that doesn't follow the specification strictly (like an <arg> without type),
+        # but the node and interface names can still be read from it
         try:
-            introspect_data = str(proxy.Introspect(dbus_interface='org.freedesktop.DBus.Introspectable'))
-        except:
+            tree = ET.fromstring(introspect_data)
+        except ET.ParseError:
             self._interfaces = None
             return
-        tree = ET.fromstring(introspect_data)
         for child in tree:
             dbus_service.show_progress()
             if child.tag == 'node' and 'name' in child.attrib:
@@ -180,32 +590,43 @@ class dbus_object:
             if child.tag == 'interface' and 'name' in child.attrib:
                 self._interfaces.append(child.attrib['name'])
                 continue
+        self._interfaces_set = frozenset(self._interfaces)
+
+    def _load_node_info(self, node_info):
+        for node in node_info.nodes:
+            dbus_service.show_progress()
+            if node.path is None:
+                continue
+            # some services describe the whole subtree inline; there is no need to introspect those nodes again,
+            # but a node that only lists its children says nothing about its own interfaces
+            preloaded_node_info = node if len(node.interfaces) != 0 else None
+            self._child_objects.append(dbus_object(self._bus, self._service_name, node.path, self, preloaded_node_info=preloaded_node_info))
+        for interface in node_info.interfaces:
+            dbus_service.show_progress()
+            self._interfaces.append(interface.name)
+        self._interfaces_set = frozenset(self._interfaces)
 
     def get_children_objects(self):
+        children = {}
+        self._collect(children)
+        return children
+
+    def _collect(self, children):
         if self._interfaces is None or len(self._interfaces) != 0:
-            children = {self.get_path(): self}
-        else:
-            children = {}
+            children[self._path] = self
         for child in self._child_objects:
-            children = children | child.get_children_objects()
-        return children
+            child._collect(children)
 
-def print_service_data(service, service_list):
+def print_service_data(service, process_services):
     global verbose
     global search_interface
     global search_object
     global search_process
 
-    if service.processed:
-        return
-
     executable, pid = service.get_executable()
     # print all the services that share the same process
-    for s in service_list:
-        exec, pid2 = s.get_executable()
-        if pid == pid2:
-            print(s.get_name())
-            s.processed = True
+    for s in process_services:
+        print(s.get_name())
     if executable is None:
         executable = "Unknown"
         pid = "Not running"
@@ -216,36 +637,34 @@ def print_service_data(service, service_list):
     for object_name in objects:
         if (not verbose) and (not objects[object_name].has_interface(search_interface)):
             continue
-        if (not verbose) and (search_interface is None) and (search_object is not None) and (not fnmatch.fnmatch(object_name, search_object)):
+        if (not verbose) and (search_interface is None) and (search_object is not None) and (not search_object.match(object_name)):
             continue
         print(f"  {object_name}")
         for interface_name in objects[object_name].get_interfaces():
             print(f"    {interface_name}")
     print()
 
-services = dbus_service.get_services(current_bus, all, wakeup)
-
-if search_service is not None:
-    services = [service for service in services if fnmatch.fnmatch(service.get_name(), search_service)]
-
-def sort_services(e):
-    if e.get_executable()[0] is None:
-        return ""
-    return e.get_name()
+services = dbus_service.get_services(current_bus, all, wakeup, cache_dir, search_service, search_process)
 
 found = False
-services.sort(key=sort_services)
+# services without a known process go first
+services.sort(key=lambda e: (e._executable is not None, e._name))
 
+services_by_pid = defaultdict(list)
 for service in services:
-    service.processed = False
+    services_by_pid[service.get_executable()[1]].append(service)
 
+# each process is printed at the position of its first service that passes the filters
+printed_pids = set()
 for service in services:
-    if not service.has_object(search_object) or not service.has_interface(search_interface):
+    pid = service.get_executable()[1]
+    if pid in printed_pids:
         continue
-    if (search_process is not None) and (not fnmatch.fnmatch(service.get_executable()[0], search_process)):
+    if not service.has_object(search_object) or not service.has_interface(search_interface):
         continue
     found = True
-    print_service_data(service, services)
+    printed_pids.add(pid)
+    print_service_data(service, services_by_pid[pid])
 
 if not found:
     print("No DBus services found with the specified filters")